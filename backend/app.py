@@ -1,28 +1,254 @@
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
-import json
+import fcntl
+import msgspec
+import orjson
 import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
 from datetime import datetime
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 
+# Optional ANN index; the linear scan fallback is fine for a small KB
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+# Optional JIT for the linear similarity scan
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(fastmath=True, cache=True)
+    def best_match(q, matrix):
+        """Return (index, score) of the row most similar to q"""
+        best_idx = 0
+        best_score = -2.0
+        for i in range(matrix.shape[0]):
+            score = 0.0
+            for j in range(matrix.shape[1]):
+                score += matrix[i, j] * q[j]
+            if score > best_score:
+                best_score = score
+                best_idx = i
+        return best_idx, best_score
+else:
+    def best_match(q, matrix):
+        """NumPy fallback for the Numba best_match kernel"""
+        scores = matrix.dot(q)
+        best_idx = int(scores.argmax())
+        return best_idx, float(scores[best_idx])
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson for faster (de)serialization"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+class AskRequest(msgspec.Struct):
+    """Validated /ask request body, parsed in one pass by msgspec"""
+    question: str
+
+def json_response(payload, status=200):
+    """Build a JSON response through msgspec's C encoder"""
+    return Response(msgspec.json.encode(payload), status=status,
+                    mimetype='application/json')
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 CORS(app)
 
 # Global variables for the model and knowledge base
 model = None
+tokenizer = None
+onnx_session = None
 knowledge_base = None
 knowledge_embeddings = None
+kb_index = None  # HNSW index over the knowledge embeddings
+# Pre-allocated output buffer for the linear scan fallback, guarded by a
+# lock since threaded workers can run requests concurrently
+kb_scores = None
+kb_scores_lock = threading.Lock()
+
+# Quantized ONNX export produced by export_onnx.py (preferred when present)
+ONNX_MODEL_PATH = "models/all-MiniLM-L6-v2-int8.onnx"
+
+# Precomputed KB embeddings; delete this file after editing knowledge_base
+# or refitting the PCA projection
+KB_EMBEDDINGS_FILE = "data/kb_embeddings.npy"
+
+# PCA projection produced by fit_pca.py (applied when present)
+PCA_COMPONENTS_FILE = "data/pca_components.npy"
+EMBEDDING_DIM = 384  # raw MiniLM output dimension
+pca_components = None
+
+# Chat history is appended as JSONL by a background thread so the request
+# path never blocks on disk I/O; appends and trims take an flock since
+# every gunicorn worker writes to the same file
+HISTORY_FILE = "data/chat_history.jsonl"
+LEGACY_HISTORY_FILE = "data/chat_history.json"
+HISTORY_LIMIT = 50
+HISTORY_TRIM_INTERVAL = 100  # writes between trims of the file
+history_queue = queue.Queue()
+
+# Recent history is also kept in memory so /history never touches disk;
+# the file is purely a durability sink
+history_buffer = deque(maxlen=HISTORY_LIMIT)
+
+# Concurrent questions are micro-batched through one encode call; each
+# request enqueues (question, Future) and blocks on the embedding
+ENCODE_BATCH_SIZE = 32
+encode_queue = queue.Queue()
+
+# Two-tier answer cache: exact question strings, plus a semantic cache of
+# recent query embeddings matched by cosine similarity
+EXACT_CACHE_SIZE = 512
+SEMANTIC_CACHE_THRESHOLD = 0.95
+exact_cache = {}
+semantic_cache = deque(maxlen=512)
+semantic_cache_matrix = None  # stacked cache embeddings, rebuilt lazily
+# One lock covers eviction, appends, and matrix rebuilds so threaded
+# workers can't mutate the caches mid-lookup
+cache_lock = threading.Lock()
+
+# Background threads are started per process (see ensure_workers)
+workers_started = False
+workers_lock = threading.Lock()
+
+def initialize(torch_threads=None, preloading=False):
+    """Load the model and knowledge base (fork-safe: starts no threads)"""
+    import torch
+    # Single-process dev server uses all cores; gunicorn workers pass 1
+    # since the processes provide the parallelism and extra threads just
+    # contend for the GIL and caches
+    num_threads = torch_threads or os.cpu_count()
+    torch.set_num_threads(num_threads)
+    load_projection()
+    load_model(num_threads, preloading)
+    load_knowledge_base()
+    # Seed the in-memory buffer from disk once so /history survives restarts
+    os.makedirs("data", exist_ok=True)
+    migrate_legacy_history()
+    history_buffer.extend(read_recent_history(HISTORY_LIMIT))
+    # Warm up the encoder and the JIT-compiled similarity kernel so the
+    # first request doesn't pay the one-time dispatch/compile costs
+    encode(["warmup"])
+    best_match(np.zeros(8, dtype=np.float32), np.zeros((1, 8), dtype=np.float32))
+
+def ensure_workers():
+    """Start the background threads once per process.
+
+    Threads don't survive fork(), so under gunicorn --preload they must be
+    started in each worker rather than in the preloaded master; the first
+    request in a process triggers this.
+    """
+    global workers_started
+    if workers_started:
+        return
+    with workers_lock:
+        if not workers_started:
+            start_history_writer()
+            start_encode_worker()
+            workers_started = True
 
-def load_model():
-    """Load the sentence transformer model"""
-    global model
-    print("Loading sentence transformer model...")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+def load_projection():
+    """Load the PCA projection matrix fitted by fit_pca.py, if present"""
+    global pca_components
+    if os.path.exists(PCA_COMPONENTS_FILE):
+        pca_components = np.load(PCA_COMPONENTS_FILE).astype(np.float32)
+        print(f"Loaded PCA projection to {pca_components.shape[0]} dimensions")
+
+def load_model(num_threads=None, preloading=False):
+    """Load the embedding model, preferring the INT8 ONNX export"""
+    global model, tokenizer, onnx_session
+
+    if os.path.exists(ONNX_MODEL_PATH):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        print("Loading INT8 ONNX model...")
+        options = ort.SessionOptions()
+        # Same per-process budget as the torch path; gunicorn workers get 1
+        # thread each so nproc workers don't spin up nproc threads apiece
+        options.intra_op_num_threads = num_threads or os.cpu_count()
+        onnx_session = ort.InferenceSession(
+            ONNX_MODEL_PATH, options, providers=['CPUExecutionProvider'])
+        tokenizer = AutoTokenizer.from_pretrained(
+            'sentence-transformers/all-MiniLM-L6-v2')
+    else:
+        import torch
+        print("Loading sentence transformer model...")
+        model = SentenceTransformer('all-MiniLM-L6-v2')
+        # FP16 pays off on GPU; on CPU keep FP32, which is faster without
+        # BF16-capable hardware. When preloading for gunicorn the model
+        # stays on CPU: CUDA initialized before fork() cannot be reused in
+        # the forked workers, so GPU needs a non-forking deployment
+        if torch.cuda.is_available() and not preloading:
+            model = model.to('cuda').half()
+        torch.backends.mkldnn.enabled = True
     print("Model loaded successfully!")
 
+def encode(texts):
+    """Embed a list of texts, via ONNX Runtime when available"""
+    if onnx_session is None:
+        import torch
+        # inference_mode drops autograd bookkeeping on every op
+        with torch.inference_mode():
+            embeddings = model.encode(texts)
+    else:
+        # Tokenize, run the quantized transformer, then mean-pool in NumPy
+        tokens = tokenizer(texts, padding=True, truncation=True, return_tensors='np')
+        feed = {inp.name: tokens[inp.name] for inp in onnx_session.get_inputs()}
+        hidden_states = onnx_session.run(None, feed)[0]
+        mask = tokens['attention_mask'][:, :, None].astype(np.float32)
+        embeddings = (hidden_states * mask).sum(axis=1) / mask.sum(axis=1)
+
+    # Project into the reduced PCA space when a projection was fitted
+    if pca_components is not None:
+        embeddings = embeddings @ pca_components.T
+    return embeddings
+
+def encode_worker():
+    """Drain queued questions and encode them in one batched forward pass"""
+    while True:
+        batch = [encode_queue.get()]
+        # Take whatever else is already queued without waiting: requests
+        # that arrive during an encode batch up for the next round, so
+        # concurrency still batches while a lone request pays no delay
+        try:
+            while len(batch) < ENCODE_BATCH_SIZE:
+                batch.append(encode_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        try:
+            embeddings = encode([question for question, _ in batch])
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+
+def start_encode_worker():
+    """Start the daemon thread that batches encode requests"""
+    threading.Thread(target=encode_worker, daemon=True).start()
+
+def encode_one(question):
+    """Embed a single question through the micro-batching worker"""
+    future = Future()
+    encode_queue.put((question, future))
+    return future.result()
+
 def load_knowledge_base():
     """Load the knowledge base and compute embeddings"""
     global knowledge_base, knowledge_embeddings, model
@@ -71,124 +297,225 @@ def load_knowledge_base():
         }
     ]
     
-    # Compute embeddings for all questions
-    questions = [item["question"] for item in knowledge_base]
-    print("Computing embeddings for knowledge base...")
-    knowledge_embeddings = model.encode(questions)
+    expected_dim = pca_components.shape[0] if pca_components is not None else EMBEDDING_DIM
+    knowledge_embeddings = None
+    if os.path.exists(KB_EMBEDDINGS_FILE):
+        # Reuse precomputed embeddings and skip the transformer entirely
+        print("Loading precomputed knowledge base embeddings...")
+        knowledge_embeddings = np.load(KB_EMBEDDINGS_FILE)
+        if knowledge_embeddings.shape[1] != expected_dim:
+            print("Cached embeddings don't match the current dimension, recomputing...")
+            knowledge_embeddings = None
+    if knowledge_embeddings is None:
+        # Compute embeddings for all questions and normalize once at load
+        # time so per-query similarity is a plain dot product
+        questions = [item["question"] for item in knowledge_base]
+        print("Computing embeddings for knowledge base...")
+        knowledge_embeddings = encode(questions)
+        knowledge_embeddings /= np.linalg.norm(knowledge_embeddings, axis=1, keepdims=True)
+        os.makedirs("data", exist_ok=True)
+        np.save(KB_EMBEDDINGS_FILE, knowledge_embeddings.astype(np.float32))
+
+    # Build the HNSW index from the full-precision embeddings so lookups
+    # stay fast as the KB grows, without baking in float16 rounding
+    kb_float32 = np.ascontiguousarray(knowledge_embeddings, dtype=np.float32)
+    if hnswlib is not None:
+        global kb_index
+        kb_index = hnswlib.Index(space='cosine', dim=kb_float32.shape[1])
+        kb_index.init_index(max_elements=100000, ef_construction=200, M=16)
+        kb_index.add_items(kb_float32, np.arange(len(knowledge_base)))
+
+    # The float16 copy only backs the linear-scan fallback, halving the
+    # bytes moved per lookup
+    knowledge_embeddings = np.ascontiguousarray(kb_float32, dtype=np.float16)
+
+    global kb_scores
+    kb_scores = np.empty(len(knowledge_base), dtype=np.float16)
     print("Knowledge base loaded and embeddings computed!")
 
+def cache_answer(user_question, q, answer, confidence):
+    """Remember a computed answer in both cache tiers"""
+    global semantic_cache_matrix
+
+    with cache_lock:
+        if len(exact_cache) >= EXACT_CACHE_SIZE:
+            exact_cache.pop(next(iter(exact_cache)))  # evict oldest entry
+        exact_cache[user_question] = (answer, confidence)
+        semantic_cache.append((q, answer, confidence))
+        semantic_cache_matrix = None  # rebuilt lazily on next lookup
+
 def find_best_answer(user_question):
     """Find the best matching answer from the knowledge base"""
-    global model, knowledge_base, knowledge_embeddings
-    
-    # Encode the user question
-    user_embedding = model.encode([user_question])
-    
-    # Compute similarities
-    similarities = cosine_similarity(user_embedding, knowledge_embeddings)[0]
-    
-    # Find the best match
-    best_match_idx = np.argmax(similarities)
-    confidence = similarities[best_match_idx]
-    
+    global model, knowledge_base, knowledge_embeddings, semantic_cache_matrix
+
+    # Exact-match cache: repeated questions skip the encoder entirely
+    cached = exact_cache.get(user_question)
+    if cached is not None:
+        return cached
+
+    # Encode the user question (batched with concurrent requests) and
+    # normalize it
+    q = encode_one(user_question)
+    q = q / np.linalg.norm(q)
+
+    # Semantic cache: near-duplicate questions reuse a recent answer. The
+    # lock keeps the matrix and the deque it indexes into in sync; the
+    # scan itself is microseconds over at most 512 rows
+    with cache_lock:
+        if semantic_cache:
+            if semantic_cache_matrix is None:
+                semantic_cache_matrix = np.ascontiguousarray(
+                    [entry[0] for entry in semantic_cache], dtype=np.float32)
+            cache_hit_idx, cache_score = best_match(
+                q.astype(np.float32, copy=False), semantic_cache_matrix)
+            if cache_score >= SEMANTIC_CACHE_THRESHOLD:
+                _, answer, confidence = semantic_cache[cache_hit_idx]
+                return answer, confidence
+
+    # Find the best match: HNSW index when available, linear scan otherwise
+    if kb_index is not None:
+        labels, distances = kb_index.knn_query(q, k=1)
+        best_match_idx = int(labels[0][0])
+        confidence = float(1.0 - distances[0][0])  # cosine distance -> similarity
+    else:
+        # Knowledge embeddings are pre-normalized, so cosine similarity is
+        # one matmul into the pre-allocated score buffer; the query is cast
+        # to match the float16 storage
+        with kb_scores_lock:
+            np.dot(knowledge_embeddings, q.astype(np.float16), out=kb_scores)
+            best_match_idx = int(kb_scores.argmax())
+            confidence = float(kb_scores[best_match_idx])
+
     # Return the answer if confidence is above threshold
     if confidence > 0.3:  # Adjust threshold as needed
-        return knowledge_base[best_match_idx]["answer"], confidence
+        answer = knowledge_base[best_match_idx]["answer"]
     else:
-        return "I'm sorry, I don't have information about that specific topic. Could you try rephrasing your question or ask about productivity, remote work, task prioritization, startup funding, or professional development?", 0.0
+        answer = "I'm sorry, I don't have information about that specific topic. Could you try rephrasing your question or ask about productivity, remote work, task prioritization, startup funding, or professional development?"
+        confidence = 0.0
 
-def save_chat_history(question, answer):
-    """Save chat history to local JSON file"""
-    history_file = "data/chat_history.json"
-    
-    # Create data directory if it doesn't exist
-    os.makedirs("data", exist_ok=True)
-    
-    # Load existing history
-    if os.path.exists(history_file):
-        with open(history_file, 'r', encoding='utf-8') as f:
-            history = json.load(f)
-    else:
-        history = []
-    
-    # Add new entry
-    new_entry = {
-        "timestamp": datetime.now().isoformat(),
+    cache_answer(user_question, q, answer, confidence)
+    return answer, confidence
+
+def save_chat_history(question, answer, timestamp):
+    """Record a chat entry in memory and queue it for the writer thread"""
+    entry = {
+        "timestamp": timestamp,
         "question": question,
         "answer": answer
     }
-    
-    history.append(new_entry)
-    
-    # Keep only last 50 entries to prevent file from growing too large
-    history = history[-50:]
-    
-    # Save updated history
-    with open(history_file, 'w', encoding='utf-8') as f:
-        json.dump(history, f, indent=2, ensure_ascii=False)
+    history_buffer.append(entry)
+    history_queue.put_nowait(entry)
+
+def migrate_legacy_history():
+    """One-time import of the pre-JSONL chat_history.json file"""
+    if os.path.exists(HISTORY_FILE) or not os.path.exists(LEGACY_HISTORY_FILE):
+        return
+    with open(LEGACY_HISTORY_FILE, 'rb') as f:
+        entries = orjson.loads(f.read())
+    with open(HISTORY_FILE, 'wb') as f:
+        for entry in entries[-HISTORY_LIMIT:]:
+            f.write(orjson.dumps(entry) + b'\n')
+    print(f"Migrated {min(len(entries), HISTORY_LIMIT)} legacy history entries to JSONL")
+
+def trim_history_file():
+    """Drop all but the last HISTORY_LIMIT entries from the history file"""
+    # Rewrite in place under the same lock the appenders take, so entries
+    # appended concurrently by other workers can't be dropped
+    with open(HISTORY_FILE, 'rb+') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        lines = f.read().splitlines(keepends=True)
+        if len(lines) > HISTORY_LIMIT:
+            f.seek(0)
+            f.truncate()
+            f.writelines(lines[-HISTORY_LIMIT:])
+
+def history_writer():
+    """Consumer loop that appends queued chat entries to the JSONL file"""
+    writes = 0
+    while True:
+        entry = history_queue.get()
+        with open(HISTORY_FILE, 'ab') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.write(orjson.dumps(entry) + b'\n')
+        writes += 1
+        # Trim periodically instead of rewriting the file on every message
+        if writes % HISTORY_TRIM_INTERVAL == 0:
+            trim_history_file()
+
+def start_history_writer():
+    """Start the daemon thread that persists chat history"""
+    threading.Thread(target=history_writer, daemon=True).start()
+
+def read_recent_history(count=10):
+    """Read the last `count` history entries via a reverse seek"""
+    if not os.path.exists(HISTORY_FILE):
+        return []
+    with open(HISTORY_FILE, 'rb') as f:
+        # Seek back far enough from the end to cover `count` lines
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 64 * 1024))
+        lines = f.read().splitlines()
+    return [orjson.loads(line) for line in lines[-count:] if line]
 
 @app.route('/ask', methods=['POST'])
 def ask_question():
     """API endpoint to handle user questions"""
     try:
-        data = request.get_json()
-        
-        if not data or 'question' not in data:
-            return jsonify({
+        ensure_workers()
+
+        # Parse and validate the body in a single msgspec pass; a missing
+        # or mistyped question field surfaces as a DecodeError
+        try:
+            data = msgspec.json.decode(request.get_data(), type=AskRequest)
+        except msgspec.DecodeError:
+            return json_response({
                 'error': 'Question is required',
                 'answer': '',
                 'confidence': 0.0
-            }), 400
-        
-        user_question = data['question'].strip()
-        
+            }, 400)
+
+        user_question = data.question.strip()
+
         if not user_question:
-            return jsonify({
+            return json_response({
                 'error': 'Question cannot be empty',
                 'answer': '',
                 'confidence': 0.0
-            }), 400
+            }, 400)
         
         # Find the best answer
         answer, confidence = find_best_answer(user_question)
-        
+
+        # One timestamp per request, shared by the history entry and response
+        timestamp = datetime.now().isoformat()
+
         # Save to chat history
-        save_chat_history(user_question, answer)
-        
+        save_chat_history(user_question, answer, timestamp)
+
         # Return response
         response = {
             'question': user_question,
             'answer': answer,
             'confidence': float(confidence),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': timestamp
         }
-        
-        return jsonify(response)
-    
+
+        return json_response(response)
+
     except Exception as e:
         print(f"Error processing request: {str(e)}")
-        return jsonify({
+        return json_response({
             'error': 'Internal server error',
             'answer': 'Sorry, there was an error processing your question. Please try again.',
             'confidence': 0.0
-        }), 500
+        }, 500)
 
 @app.route('/history', methods=['GET'])
 def get_chat_history():
     """API endpoint to get recent chat history"""
     try:
-        history_file = "data/chat_history.json"
-        
-        if os.path.exists(history_file):
-            with open(history_file, 'r', encoding='utf-8') as f:
-                history = json.load(f)
-            
-            # Return last 10 entries
-            recent_history = history[-10:] if len(history) > 10 else history
-            return jsonify({'history': recent_history})
-        else:
-            return jsonify({'history': []})
-    
+        return jsonify({'history': list(history_buffer)[-10:]})
+
     except Exception as e:
         print(f"Error getting chat history: {str(e)}")
         return jsonify({'error': 'Error retrieving chat history', 'history': []})
@@ -198,16 +525,16 @@ def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'model_loaded': model is not None,
+        'model_loaded': model is not None or onnx_session is not None,
         'knowledge_base_loaded': knowledge_base is not None
     })
 
 if __name__ == '__main__':
     print("Starting AI Chatbot Backend...")
-    
+
     # Load model and knowledge base on startup
-    load_model()
-    load_knowledge_base()
-    
+    initialize()
+    ensure_workers()
+
     print("Backend ready! Starting server...")
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,34 @@
+
+"""Export all-MiniLM-L6-v2 to ONNX and dynamically quantize it to INT8.
+
+Run once before starting the backend:
+    python export_onnx.py
+
+app.py automatically uses models/all-MiniLM-L6-v2-int8.onnx when it exists,
+otherwise it falls back to the PyTorch SentenceTransformer.
+"""
+
+import os
+from optimum.exporters.onnx import main_export
+from onnxruntime.quantization import quantize_dynamic, QuantType
+
+MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+EXPORT_DIR = "models/all-MiniLM-L6-v2-onnx"
+QUANTIZED_PATH = "models/all-MiniLM-L6-v2-int8.onnx"
+
+def main():
+    os.makedirs("models", exist_ok=True)
+
+    print("Exporting model to ONNX...")
+    main_export(MODEL_ID, output=EXPORT_DIR, task="feature-extraction")
+
+    print("Quantizing weights to INT8...")
+    quantize_dynamic(
+        os.path.join(EXPORT_DIR, "model.onnx"),
+        QUANTIZED_PATH,
+        weight_type=QuantType.QInt8
+    )
+    print(f"Quantized model saved to {QUANTIZED_PATH}")
+
+if __name__ == '__main__':
+    main()
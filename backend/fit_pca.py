@@ -0,0 +1,58 @@
+
+"""Fit a PCA projection that reduces MiniLM embeddings to 128 dimensions.
+
+Run offline with a representative query corpus (requires scikit-learn,
+which the server itself no longer depends on):
+    python fit_pca.py corpus.txt [more.txt ...]
+
+Each corpus file holds one query per line; recorded chat history is
+included automatically. The projection matrix is saved to
+data/pca_components.npy and picked up by app.py at startup. Delete
+data/kb_embeddings.npy afterwards so the knowledge base embeddings are
+recomputed in the reduced space.
+"""
+
+import os
+import sys
+import orjson
+import numpy as np
+from sklearn.decomposition import PCA
+from sentence_transformers import SentenceTransformer
+
+N_COMPONENTS = 128
+HISTORY_FILE = "data/chat_history.jsonl"
+PCA_COMPONENTS_FILE = "data/pca_components.npy"
+
+def load_corpus(extra_files):
+    """Collect corpus texts from chat history and any extra files"""
+    texts = []
+    if os.path.exists(HISTORY_FILE):
+        with open(HISTORY_FILE, 'rb') as f:
+            for line in f.read().splitlines():
+                if line:
+                    texts.append(orjson.loads(line)["question"])
+    for path in extra_files:
+        with open(path, encoding='utf-8') as f:
+            texts.extend(line.strip() for line in f if line.strip())
+    return texts
+
+def main():
+    texts = load_corpus(sys.argv[1:])
+    if len(texts) < 2:
+        sys.exit("Need at least two corpus texts to fit a projection")
+
+    print(f"Encoding {len(texts)} corpus texts...")
+    model = SentenceTransformer('all-MiniLM-L6-v2')
+    embeddings = model.encode(texts)
+
+    # A small corpus can't support the full component count
+    n_components = min(N_COMPONENTS, embeddings.shape[0], embeddings.shape[1])
+    print(f"Fitting PCA with {n_components} components...")
+    pca = PCA(n_components=n_components).fit(embeddings)
+
+    os.makedirs("data", exist_ok=True)
+    np.save(PCA_COMPONENTS_FILE, pca.components_.astype(np.float32))
+    print(f"Projection matrix saved to {PCA_COMPONENTS_FILE}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+
+"""WSGI entry point for running the backend under a production server.
+
+    gunicorn --preload --workers $(nproc) --worker-class gthread \
+        --threads 8 --bind 0.0.0.0:5000 wsgi:app
+
+Threaded workers let several requests be in flight per process, which is
+what gives the encode micro-batching something to batch; with sync
+workers each process only ever sees one request at a time.
+
+--preload initializes the model and knowledge base once in the master
+process, so the embedding arrays stay copy-on-write shared across the
+forked workers instead of being loaded per worker. Only loading happens
+here: the background threads (history writer, encode batcher) would not
+survive the fork, so each worker starts them on its first request via
+ensure_workers(). The model also stays on CPU — CUDA state initialized
+before fork() is unusable in the workers, so use a non-forking server
+(e.g. the dev server, or one worker without --preload) to run on GPU.
+"""
+
+from app import app, initialize
+
+initialize(torch_threads=1, preloading=True)